@@ -1,7 +1,9 @@
 # main.py (updated)
 
 import os
+import orjson
 from flask import Flask, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
 # Assuming user_bp and db are not needed for ECR simulator, removing them. If needed, add back.
@@ -9,7 +11,24 @@ from flask_cors import CORS
 # from src.routes.user import user_bp
 from src.routes.ecr import ecr_bp
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that (de)serializes with orjson instead of stdlib json."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), "static"))
+app.json = OrjsonProvider(app)  # also used by request.get_json()
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "asdf#FGSgvasgf$5$WGT")
 
 CORS(app, origins=["*"])  # Restrict in production if needed
@@ -1,14 +1,16 @@
 import json
 import time
 import os
-import binascii
 import uuid
 import threading
 import serial
 import socket
+import ssl
 import struct
 from base64 import b64encode
+from collections import OrderedDict
 import logging
+import orjson
 import requests
 
 # Configure logging
@@ -42,31 +44,86 @@ if os.path.exists(SETTINGS_FILE):
         app_settings = {}
 else:
     logger.warning("Settings file not found, using defaults")
+# Serialized form of app_settings as last written; served directly on GET
+_settings_serialized = orjson.dumps(app_settings, option=orjson.OPT_INDENT_2)
+_settings_lock = threading.Lock()
 
-transaction_history = {}
+transaction_history = OrderedDict()  # Insertion order is oldest first
 is_connected = False
 connected_socket = None  # For maintaining a persistent socket connection, if needed
-
-
-# ReqData structure based on documentation
-class ReqData:
-    def __init__(self):
-        self.chTransType = 0x00  # 1 byte - Transaction type
-        self.szAmount = b"000000000000"  # 12 bytes - Transaction amount
-        self.szInvNo = b"000000"  # 6 bytes - Invoice number
-        self.szCardNo = b"\x00" * 19  # 19 bytes - Card number
-
-    def pack(self):
-        """Pack ReqData structure into bytes according to documentation format."""
-        packed = struct.pack("B", self.chTransType)  # 1 byte
-        packed += self.szAmount[:12].ljust(12, b"\x00")  # 12 bytes
-        packed += self.szInvNo[:6].ljust(6, b"\x00")  # 6 bytes
-        packed += self.szCardNo[:19].ljust(19, b"\x00")  # 19 bytes
-        return packed
+connected_serial = None  # Serial port kept open between /connect and disconnect
+_history_json = None  # Cached /history body, reset whenever the history changes
+_state_lock = threading.Lock()  # Guards transaction_history and connection globals
+_io_lock = threading.Lock()  # Serializes request/response exchanges on a shared link
+
+_TRANS_TYPE_MAP = {
+    "SALE": "01",
+    "INSTALLMENT": "02",
+    "VOID": "03",
+    "REFUND": "04",
+    "QRIS MPM": "05",
+    "QRIS NOTIFICATION": "06",
+    "QRIS REFUND": "07",
+    "POINT REWARD": "08",
+    "TEST HOST": "09",
+    "QRIS CPM": "0A",
+    "SETTLEMENT": "0B",
+    "REPRINT": "0C",
+    "REPORT": "0D",
+    "LOGON": "0E",
+}
+_TRANS_CODE_INT = {code: int(code, 16) for code in _TRANS_TYPE_MAP.values()}
+
+# The ECR adaptor uses a self-signed certificate, so verification is disabled
+_SSL_CTX = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+_SSL_CTX.check_hostname = False
+_SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Precompiled layouts; "s" fields are truncated/null-padded by struct itself
+# ReqData: chTransType(1) szAmount(12) szInvNo(6) szCardNo(19) = 38 bytes
+_REQ_STRUCT = struct.Struct("<B12s6s19s")
+_RSP_STRUCT = struct.Struct(
+    "<B8s15s6s6sB12s12s12s19s26s8s6s6s2s12s6s2s12s9s11s9s"
+)  # RspData without szFiller: 201 bytes
+_RSP_LEN = _RSP_STRUCT.size + 99  # Full RspData including szFiller
+# Receive buffer for the persistent socket, only touched while holding _io_lock
+_RECV_BUF = bytearray(_RSP_LEN)
+_RECV_VIEW = memoryview(_RECV_BUF)
+
+
+def _strip_decode(field):
+    """Decode a null-padded fixed-width field to str."""
+    return field.rstrip(b"\x00").decode("ascii", "ignore")
 
 
 # RspData structure based on documentation
 class RspData:
+    __slots__ = (
+        "chTransType",
+        "szTID",
+        "szMID",
+        "szTraceNo",
+        "szInvoiceNo",
+        "chEntryMode",
+        "szTransAmount",
+        "szTransAddAmount",
+        "szTotalAmount",
+        "szCardNo",
+        "szCardholderName",
+        "szDate",
+        "szTime",
+        "szApprovalCode",
+        "szResponseCode",
+        "szRefNumber",
+        "szReferenceId",
+        "szTerm",
+        "szMonthlyAmount",
+        "szPointReward",
+        "szRedemptionAmount",
+        "szPointBalance",
+        "szFiller",
+    )
+
     def __init__(self):
         self.chTransType = 0x00  # 1 byte - Transaction type
         self.szTID = b"\x00" * 8  # 8 bytes - Terminal ID
@@ -96,121 +153,89 @@ class RspData:
     def unpack(cls, data):
         """Unpack bytes into RspData structure according to documentation format."""
         rsp = cls()
-        offset = 0
-        rsp.chTransType = struct.unpack_from("B", data, offset)[0]
-        offset += 1
-        rsp.szTID = data[offset : offset + 8]
-        offset += 8
-        rsp.szMID = data[offset : offset + 15]
-        offset += 15
-        rsp.szTraceNo = data[offset : offset + 6]
-        offset += 6
-        rsp.szInvoiceNo = data[offset : offset + 6]
-        offset += 6
-        rsp.chEntryMode = struct.unpack_from("B", data, offset)[0]
-        offset += 1
-        rsp.szTransAmount = data[offset : offset + 12]
-        offset += 12
-        rsp.szTransAddAmount = data[offset : offset + 12]
-        offset += 12
-        rsp.szTotalAmount = data[offset : offset + 12]
-        offset += 12
-        rsp.szCardNo = data[offset : offset + 19]
-        offset += 19
-        rsp.szCardholderName = data[offset : offset + 26]
-        offset += 26
-        rsp.szDate = data[offset : offset + 8]
-        offset += 8
-        rsp.szTime = data[offset : offset + 6]
-        offset += 6
-        rsp.szApprovalCode = data[offset : offset + 6]
-        offset += 6
-        rsp.szResponseCode = data[offset : offset + 2]
-        offset += 2
-        rsp.szRefNumber = data[offset : offset + 12]
-        offset += 12
-        rsp.szReferenceId = data[offset : offset + 6]
-        offset += 6
-        rsp.szTerm = data[offset : offset + 2]
-        offset += 2
-        rsp.szMonthlyAmount = data[offset : offset + 12]
-        offset += 12
-        rsp.szPointReward = data[offset : offset + 9]
-        offset += 9
-        rsp.szRedemptionAmount = data[offset : offset + 11]
-        offset += 11
-        rsp.szPointBalance = data[offset : offset + 9]
-        offset += 9
-        if offset < len(data):
-            rsp.szFiller = data[offset : offset + 99]
+        (
+            rsp.chTransType,
+            rsp.szTID,
+            rsp.szMID,
+            rsp.szTraceNo,
+            rsp.szInvoiceNo,
+            rsp.chEntryMode,
+            rsp.szTransAmount,
+            rsp.szTransAddAmount,
+            rsp.szTotalAmount,
+            rsp.szCardNo,
+            rsp.szCardholderName,
+            rsp.szDate,
+            rsp.szTime,
+            rsp.szApprovalCode,
+            rsp.szResponseCode,
+            rsp.szRefNumber,
+            rsp.szReferenceId,
+            rsp.szTerm,
+            rsp.szMonthlyAmount,
+            rsp.szPointReward,
+            rsp.szRedemptionAmount,
+            rsp.szPointBalance,
+        ) = _RSP_STRUCT.unpack_from(data, 0)
+        if _RSP_STRUCT.size < len(data):
+            rsp.szFiller = memoryview(data)[_RSP_STRUCT.size : _RSP_STRUCT.size + 99]
         return rsp
 
     def to_dict(self):
         """Convert RspData to dictionary for JSON response."""
+        s = _strip_decode
         return {
             "transType": f"{self.chTransType:02X}",
-            "tid": self.szTID.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "mid": self.szMID.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "traceNo": self.szTraceNo.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "invoiceNo": self.szInvoiceNo.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
+            "tid": s(self.szTID),
+            "mid": s(self.szMID),
+            "traceNo": s(self.szTraceNo),
+            "invoiceNo": s(self.szInvoiceNo),
             "entryMode": f"{self.chEntryMode:02X}",
-            "transAmount": self.szTransAmount.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "transAddAmount": self.szTransAddAmount.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "totalAmount": self.szTotalAmount.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "cardNo": self.szCardNo.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "cardholderName": self.szCardholderName.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "date": self.szDate.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "time": self.szTime.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "approvalCode": self.szApprovalCode.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "responseCode": self.szResponseCode.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "refNumber": self.szRefNumber.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "referenceId": self.szReferenceId.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "term": self.szTerm.rstrip(b"\x00").decode("ascii", errors="ignore"),
-            "monthlyAmount": self.szMonthlyAmount.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "pointReward": self.szPointReward.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "redemptionAmount": self.szRedemptionAmount.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
-            "pointBalance": self.szPointBalance.rstrip(b"\x00").decode(
-                "ascii", errors="ignore"
-            ),
+            "transAmount": s(self.szTransAmount),
+            "transAddAmount": s(self.szTransAddAmount),
+            "totalAmount": s(self.szTotalAmount),
+            "cardNo": s(self.szCardNo),
+            "cardholderName": s(self.szCardholderName),
+            "date": s(self.szDate),
+            "time": s(self.szTime),
+            "approvalCode": s(self.szApprovalCode),
+            "responseCode": s(self.szResponseCode),
+            "refNumber": s(self.szRefNumber),
+            "referenceId": s(self.szReferenceId),
+            "term": s(self.szTerm),
+            "monthlyAmount": s(self.szMonthlyAmount),
+            "pointReward": s(self.szPointReward),
+            "redemptionAmount": s(self.szRedemptionAmount),
+            "pointBalance": s(self.szPointBalance),
         }
 
 
+def _save_settings(serialized):
+    """Atomically replace SETTINGS_FILE so a crash never leaves a partial file."""
+    tmp_path = SETTINGS_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(serialized)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, SETTINGS_FILE)
+
+
+def _log_hex(msg, data):
+    """Log data as hex, skipping the conversion when INFO is disabled."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(msg, data.hex())
+
+
 def pack_request_msg(trans_type, amount, invoice_no, card_no=""):
     """Pack request message following CimbEcrLibrary.java example."""
-    req_data = ReqData()
-    req_data.chTransType = int(trans_type, 16)
-    amount_str = f"{int(float(amount) * 100):010d}00"
-    req_data.szAmount = amount_str.encode("ascii")[:12]
-    if invoice_no:
-        inv_str = f"{int(invoice_no):06d}"
-        req_data.szInvNo = inv_str.encode("ascii")[:6]
-    if card_no:
-        req_data.szCardNo = card_no.encode("ascii")[:19]
-    return req_data.pack()
+    trans_code = _TRANS_CODE_INT.get(trans_type) or int(trans_type, 16)
+    # round() so amounts like "0.29" don't truncate to 28 cents
+    amount_bytes = f"{int(round(float(amount) * 100)):010d}00".encode("ascii")
+    inv_bytes = f"{int(invoice_no):06d}".encode("ascii") if invoice_no else b"000000"
+    # Struct truncates/null-pads each field to the ReqData layout
+    return _REQ_STRUCT.pack(
+        trans_code, amount_bytes, inv_bytes, (card_no or "").encode("ascii")
+    )
 
 
 def parse_response_msg(response_bytes):
@@ -223,50 +248,107 @@ def parse_response_msg(response_bytes):
         return None, f"Error parsing response: {str(e)}"
 
 
+_SERIAL_KEYS = ("serial_port", "speed_baud", "data_bits", "stop_bits", "parity")
+
+
+def _serial_config():
+    """Line settings for serial.Serial() / apply_settings() from app_settings."""
+    return {
+        "baudrate": int(app_settings.get("speed_baud", 9600)),
+        "bytesize": int(app_settings.get("data_bits", 8)),
+        "stopbits": int(app_settings.get("stop_bits", 1)),
+        "parity": app_settings.get("parity", "N")[0].upper(),
+    }
+
+
+def _reconfigure_serial():
+    """Apply changed serial settings to the port held open by /connect."""
+    global is_connected, connected_serial
+    with _state_lock:
+        ser = connected_serial
+    if ser is None:
+        return
+    try:
+        with _io_lock:
+            ser.apply_settings(_serial_config())
+            serial_port = app_settings.get("serial_port", "")
+            if ser.port != serial_port:
+                ser.port = serial_port  # pyserial reopens an open port on change
+    except Exception as e:
+        logger.error(f"Error applying serial settings, disconnecting: {str(e)}")
+        with _state_lock:
+            if connected_serial is ser:
+                connected_serial = None
+                is_connected = False
+        ser.close()
+
+
 def send_serial_message(serial_port, message, timeout=10):
     """Send message over serial port following ECR communication protocol."""
+    global is_connected, connected_serial
+    held = connected_serial
+    # Reuse the port opened by /connect; otherwise open one just for this call
+    owned = held is None or not held.is_open or held.port != serial_port
+    ser = None
     try:
-        ser = serial.Serial(
-            port=serial_port,
-            baudrate=int(app_settings.get("speed_baud", 9600)),
-            bytesize=int(app_settings.get("data_bits", 8)),
-            stopbits=int(app_settings.get("stop_bits", 1)),
-            parity=app_settings.get("parity", "N")[0].upper(),
-            timeout=timeout,
-        )
-        logger.info(
-            f"Sending message over serial: {binascii.hexlify(message).decode()}"
-        )
-        ser.write(message)
-        response = ser.read(1024)
-        logger.info(f"Received response: {binascii.hexlify(response).decode()}")
-        ser.close()
+        if owned:
+            ser = serial.Serial(port=serial_port, timeout=timeout, **_serial_config())
+        else:
+            ser = held
+        _log_hex("Sending message over serial: %s", message)
+        with _io_lock:
+            if ser.timeout != timeout:
+                ser.timeout = timeout  # Reconfigures an open port; skip if unchanged
+            # A fresh open used to flush this; drop late bytes from the last exchange
+            ser.reset_input_buffer()
+            ser.write(message)
+            response = ser.read(1024)
+        _log_hex("Received response: %s", response)
+        if owned:
+            ser.close()
         return response, None
     except Exception as e:
         logger.error(f"Serial communication error: {str(e)}")
+        if not owned:
+            # The held port is gone (e.g. adaptor unplugged); drop the link
+            with _state_lock:
+                if connected_serial is held:
+                    connected_serial = None
+                    is_connected = False
+        if ser is not None:
+            ser.close()
         return None, f"Serial communication error: {str(e)}"
 
 
+def _recv_exact(sock, view):
+    """Fill view from sock; a single recv() may return a partial message."""
+    n = len(view)
+    offset = 0
+    while offset < n:
+        received = sock.recv_into(view[offset:])
+        if not received:
+            raise ConnectionError(
+                f"Connection closed after {offset} of {n} response bytes"
+            )
+        offset += received
+    return bytes(view)
+
+
 def send_socket_message(ip, port, message, ssl_enabled=False, timeout=10):
     """Send message over socket following ECR communication protocol."""
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
         if ssl_enabled:
-            import ssl
-
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            sock = context.wrap_socket(sock)
+            sock = _SSL_CTX.wrap_socket(sock)
         logger.info(f"Connecting to {ip}:{port}")
         sock.connect((ip, port))
-        logger.info(
-            f"Sending message over socket: {binascii.hexlify(message).decode()}"
-        )
-        sock.send(message)
-        response = sock.recv(1024)
-        logger.info(f"Received response: {binascii.hexlify(response).decode()}")
+        # Small request/response pairs: don't let Nagle hold back the request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _log_hex("Sending message over socket: %s", message)
+        sock.sendall(message)
+        response = _recv_exact(sock, memoryview(bytearray(_RSP_LEN)))
+        _log_hex("Received response: %s", response)
         sock.close()
         return response, None
     except Exception as e:
@@ -274,51 +356,53 @@ def send_socket_message(ip, port, message, ssl_enabled=False, timeout=10):
         return None, f"Socket communication error: {str(e)}"
 
 
+def _prepare_req(data):
+    """Build ReqData bytes from a request payload.
+
+    Returns (request_info, req_bytes, error); request_info is the summary
+    stored in transaction history.
+    """
+    try:
+        transaction_type = data.get("transaction_type", "SALE")
+        amount = data.get("amount", "0.00")
+        invoice_no = data.get("invoiceNo", None)
+        card_no = data.get("cardNo", "")
+        trans_code = _TRANS_TYPE_MAP.get(transaction_type.upper(), "01")
+        req_bytes = pack_request_msg(trans_code, amount, invoice_no, card_no)
+    except Exception as e:
+        logger.error(f"Error building request: {str(e)}")
+        return None, None, f"Error building request: {str(e)}"
+    request_info = {
+        "transType": trans_code,
+        "amount": amount,
+        "invoiceNo": invoice_no,
+        "cardNo": card_no,
+    }
+    return request_info, req_bytes, None
+
+
 @ecr_bp.route("/build_request", methods=["POST"])
 def build_request():
     """Build request message according to documentation format."""
     data = request.get_json()
     if not data:
         return jsonify({"error": "No JSON data provided"}), 400
-    transaction_type = data.get("transaction_type", "SALE")
-    amount = data.get("amount", "0.00")
-    invoice_no = data.get("invoiceNo", None)
-    card_no = data.get("cardNo", "")
-    trans_type_map = {
-        "SALE": "01",
-        "INSTALLMENT": "02",
-        "VOID": "03",
-        "REFUND": "04",
-        "QRIS MPM": "05",
-        "QRIS NOTIFICATION": "06",
-        "QRIS REFUND": "07",
-        "POINT REWARD": "08",
-        "TEST HOST": "09",
-        "QRIS CPM": "0A",
-        "SETTLEMENT": "0B",
-        "REPRINT": "0C",
-        "REPORT": "0D",
-        "LOGON": "0E",
-    }
-    trans_code = trans_type_map.get(transaction_type.upper(), "01")
-    try:
-        req_bytes = pack_request_msg(trans_code, amount, invoice_no, card_no)
-        return jsonify(
-            {
-                "request": binascii.hexlify(req_bytes).upper().decode("ascii"),
-                "type": "hex",
-                "structure": "ReqData",
-            }
-        )
-    except Exception as e:
-        logger.error(f"Error building request: {str(e)}")
-        return jsonify({"error": f"Error building request: {str(e)}"}), 500
+    _, req_bytes, error = _prepare_req(data)
+    if error:
+        return jsonify({"error": error}), 500
+    return jsonify(
+        {
+            "request": req_bytes.hex().upper(),
+            "type": "hex",
+            "structure": "ReqData",
+        }
+    )
 
 
 @ecr_bp.route("/process", methods=["POST"])
 def process_transaction():
     """Process transaction following CimbEcrLibrary communication flow."""
-    global is_connected, connected_socket
+    global _history_json, is_connected, connected_socket
     if not is_connected:
         return jsonify({"error": "Not connected to ECR device"}), 400
 
@@ -326,42 +410,20 @@ def process_transaction():
     if not data:
         return jsonify({"error": "No JSON data provided"}), 400
 
-    transaction_type = data.get("transaction_type", "SALE")
-    amount = data.get("amount", "0.00")
-    invoice_no = data.get("invoiceNo", None)
-    card_no = data.get("cardNo", "")
+    req_info, req_bytes, error = _prepare_req(data)
+    if error:
+        return jsonify({"error": error}), 500
 
     try:
-        trans_type_map = {
-            "SALE": "01",
-            "INSTALLMENT": "02",
-            "VOID": "03",
-            "REFUND": "04",
-            "QRIS MPM": "05",
-            "QRIS NOTIFICATION": "06",
-            "QRIS REFUND": "07",
-            "POINT REWARD": "08",
-            "TEST HOST": "09",
-            "QRIS CPM": "0A",
-            "SETTLEMENT": "0B",
-            "REPRINT": "0C",
-            "REPORT": "0D",
-            "LOGON": "0E",
-        }
-        trans_code = trans_type_map.get(transaction_type.upper(), "01")
-        req_bytes = pack_request_msg(trans_code, amount, invoice_no, card_no)
-
         trx_id = uuid.uuid4().hex[:8].upper()
-        transaction_history[trx_id] = {
+        entry = {
             "status": "processing",
-            "request": {
-                "transType": trans_code,
-                "amount": amount,
-                "invoiceNo": invoice_no,
-                "cardNo": card_no,
-            },
+            "request": req_info,
             "timestamp": time.time(),
         }
+        with _state_lock:
+            transaction_history[trx_id] = entry
+            _history_json = None
 
         communication_type = app_settings.get("communication", "Serial")
         logger.info(f"Using communication type: {communication_type}")
@@ -375,15 +437,24 @@ def process_transaction():
             else:
                 response_bytes, error = send_serial_message(serial_port, req_bytes)
         else:
-            if connected_socket:
-                logger.info(
-                    f"Sending message over existing socket: {binascii.hexlify(req_bytes).decode()}"
-                )
-                connected_socket.send(req_bytes)
-                response_bytes = connected_socket.recv(1024)
-                logger.info(
-                    f"Received response: {binascii.hexlify(response_bytes).decode()}"
-                )
+            with _state_lock:
+                sock = connected_socket
+            if sock:
+                _log_hex("Sending message over existing socket: %s", req_bytes)
+                try:
+                    with _io_lock:
+                        sock.sendall(req_bytes)
+                        response_bytes = _recv_exact(sock, _RECV_VIEW)
+                except OSError as e:
+                    # A partial frame leaves the stream out of sync; drop the link
+                    error = f"Socket communication error: {str(e)}"
+                    with _state_lock:
+                        if connected_socket is sock:
+                            connected_socket = None
+                            is_connected = False
+                    sock.close()
+                else:
+                    _log_hex("Received response: %s", response_bytes)
             else:
                 socket_ip = app_settings.get("socket_ip", "127.0.0.1")
                 socket_port = int(app_settings.get("socket_port", 9001))
@@ -394,40 +465,38 @@ def process_transaction():
 
         if error:
             logger.error(f"Communication error: {error}")
-            transaction_history[trx_id]["status"] = "error"
-            transaction_history[trx_id]["error"] = error
+            with _state_lock:
+                entry["status"] = "error"
+                entry["error"] = error
+                _history_json = None
             return jsonify({"error": error}), 500
 
         rsp_data, parse_error = parse_response_msg(response_bytes)
         if parse_error:
             logger.error(f"Parse error: {parse_error}")
-            transaction_history[trx_id]["status"] = "error"
-            transaction_history[trx_id]["error"] = parse_error
+            with _state_lock:
+                entry["status"] = "error"
+                entry["error"] = parse_error
+                _history_json = None
             return jsonify({"error": parse_error}), 400
 
         response_json = rsp_data.to_dict()
-        transaction_history[trx_id]["status"] = "completed"
-        transaction_history[trx_id]["response"] = response_json
-
-        if len(transaction_history) > 5:
-            oldest = min(
-                transaction_history, key=lambda k: transaction_history[k]["timestamp"]
-            )
-            del transaction_history[oldest]
-
-        return (
-            jsonify(
-                {
-                    "trxId": trx_id,
-                    "response_hex": binascii.hexlify(response_bytes)
-                    .upper()
-                    .decode("ascii"),
-                    "response_json": response_json,
-                    "type": "ReqData/RspData",
-                }
-            ),
-            200,
-        )
+        with _state_lock:
+            entry["status"] = "completed"
+            entry["response"] = response_json
+            if len(transaction_history) > 5:
+                transaction_history.popitem(last=False)
+            _history_json = None
+
+        result = {
+            "trxId": trx_id,
+            "response_json": response_json,
+            "type": "ReqData/RspData",
+        }
+        # Hex dump is opt-in; most callers only read response_json
+        if data.get("include_hex") is True:
+            result["response_hex"] = response_bytes.hex().upper()
+        return jsonify(result), 200
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         return jsonify({"error": f"Unexpected error: {str(e)}"}), 500
@@ -436,17 +505,28 @@ def process_transaction():
 @ecr_bp.route("/settings", methods=["GET", "POST"])
 def settings():
     """Handle ECR settings."""
-    global app_settings
+    global app_settings, _settings_serialized
     if request.method == "GET":
-        return jsonify(app_settings)
+        return Response(_settings_serialized, mimetype="application/json")
     elif request.method == "POST":
         data = request.get_json()
         if data:
-            app_settings.update(data)
             try:
-                with open(SETTINGS_FILE, "w") as f:
-                    json.dump(app_settings, f, indent=2)
-                logger.info(f"Settings updated: {app_settings}")
+                with _settings_lock:
+                    new_settings = {**app_settings, **data}
+                    serialized = orjson.dumps(new_settings, option=orjson.OPT_INDENT_2)
+                    if serialized != _settings_serialized:
+                        # Write first; live settings only change once it succeeded
+                        _save_settings(serialized)
+                        serial_changed = any(
+                            new_settings.get(k) != app_settings.get(k)
+                            for k in _SERIAL_KEYS
+                        )
+                        app_settings.update(data)
+                        _settings_serialized = serialized
+                        if serial_changed:
+                            _reconfigure_serial()
+                        logger.info(f"Settings updated: {app_settings}")
                 return jsonify({"message": "Settings updated successfully"})
             except Exception as e:
                 logger.error(f"Error saving settings: {e}")
@@ -458,7 +538,12 @@ def settings():
 @ecr_bp.route("/history", methods=["GET"])
 def get_history():
     """Get transaction history."""
-    return jsonify(transaction_history)
+    global _history_json
+    with _state_lock:
+        if _history_json is None:
+            _history_json = orjson.dumps(transaction_history)
+        body = _history_json
+    return Response(body, mimetype="application/json")
 
 
 @ecr_bp.route("/test_connection", methods=["POST"])
@@ -470,14 +555,13 @@ def test_connection():
             serial_port = app_settings.get("serial_port", "")
             if not serial_port:
                 return jsonify({"error": "No serial port specified"}), 400
-            ser = serial.Serial(
-                port=serial_port,
-                baudrate=int(app_settings.get("speed_baud", 9600)),
-                bytesize=int(app_settings.get("data_bits", 8)),
-                stopbits=int(app_settings.get("stop_bits", 1)),
-                parity=app_settings.get("parity", "N")[0].upper(),
-                timeout=2,
-            )
+            held = connected_serial
+            if held is not None and held.is_open and held.port == serial_port:
+                # Already open via /connect; COM ports can't be opened twice
+                return jsonify(
+                    {"message": f"Serial connection to {serial_port} successful"}
+                )
+            ser = serial.Serial(port=serial_port, timeout=2, **_serial_config())
             ser.close()
             return jsonify(
                 {"message": f"Serial connection to {serial_port} successful"}
@@ -502,16 +586,22 @@ def test_connection():
 @ecr_bp.route("/connect", methods=["POST"])
 def connect_ecr():
     """Connect to or disconnect from the ECR device."""
-    global is_connected, connected_socket
+    global is_connected, connected_socket, connected_serial
     data = request.get_json() or {}
     action = data.get("action", "connect")
 
     if action == "disconnect":
-        try:
-            if connected_socket:
-                connected_socket.close()
-                connected_socket = None
+        # Unpublish under the lock, close outside it
+        with _state_lock:
+            sock, ser = connected_socket, connected_serial
+            connected_socket = None
+            connected_serial = None
             is_connected = False
+        try:
+            if sock:
+                sock.close()
+            if ser:
+                ser.close()
             logger.info("Disconnected from ECR device")
             return (
                 jsonify(
@@ -531,13 +621,19 @@ def connect_ecr():
                 500,
             )
 
-    if is_connected:
+    with _state_lock:
+        already_connected = is_connected
+    if already_connected:
         return (
             jsonify({"connected": True, "message": "Already connected to ECR device"}),
             200,
         )
 
+    # Open the link without holding _state_lock so /process and /history
+    # are not stalled behind the connect timeout or TLS handshake
     communication_type = app_settings.get("communication", "Serial")
+    sock = None
+    ser = None
     try:
         if communication_type == "Serial":
             serial_port = app_settings.get("serial_port", "")
@@ -547,26 +643,8 @@ def connect_ecr():
                     jsonify({"connected": False, "error": "No serial port specified"}),
                     400,
                 )
-            ser = serial.Serial(
-                port=serial_port,
-                baudrate=int(app_settings.get("speed_baud", 9600)),
-                bytesize=int(app_settings.get("data_bits", 8)),
-                stopbits=int(app_settings.get("stop_bits", 1)),
-                parity=app_settings.get("parity", "N")[0].upper(),
-                timeout=2,
-            )
-            ser.close()
-            is_connected = True
-            logger.info(f"Serial connection to {serial_port} successful")
-            return (
-                jsonify(
-                    {
-                        "connected": True,
-                        "message": f"Serial connection to {serial_port} successful",
-                    }
-                ),
-                200,
-            )
+            ser = serial.Serial(port=serial_port, timeout=2, **_serial_config())
+            message = f"Serial connection to {serial_port} successful"
         else:
             socket_ip = app_settings.get("socket_ip", "127.0.0.1")
             socket_port = int(app_settings.get("socket_port", 9001))
@@ -574,32 +652,36 @@ def connect_ecr():
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(5)
             if ssl_enabled:
-                import ssl
-
-                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-                sock = context.wrap_socket(sock)
+                sock = _SSL_CTX.wrap_socket(sock)
             sock.connect((socket_ip, socket_port))
-            connected_socket = sock
-            is_connected = True
-            logger.info(f"Socket connection to {socket_ip}:{socket_port} successful")
-            return (
-                jsonify(
-                    {
-                        "connected": True,
-                        "message": f"Socket connection to {socket_ip}:{socket_port} successful",
-                    }
-                ),
-                200,
-            )
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            message = f"Socket connection to {socket_ip}:{socket_port} successful"
     except Exception as e:
         logger.error(f"Connection failed: {str(e)}")
-        if connected_socket:
-            connected_socket.close()
-            connected_socket = None
-        is_connected = False
+        if sock:
+            sock.close()
+        if ser:
+            ser.close()
         return (
             jsonify({"connected": False, "error": f"Connection failed: {str(e)}"}),
             500,
         )
+
+    with _state_lock:
+        lost_race = is_connected  # Another /connect finished first
+        if not lost_race:
+            connected_socket = sock
+            connected_serial = ser
+            is_connected = True
+    if lost_race:
+        if sock:
+            sock.close()
+        if ser:
+            ser.close()
+        return (
+            jsonify({"connected": True, "message": "Already connected to ECR device"}),
+            200,
+        )
+    logger.info(message)
+    return jsonify({"connected": True, "message": message}), 200
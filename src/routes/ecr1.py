@@ -2,20 +2,36 @@
 import json
 import time
 import os
-import binascii
 import uuid
 import threading
 import serial
 import socket
+import ssl
+import queue
 from base64 import b64encode
+from collections import OrderedDict
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import requests
+from requests.adapters import HTTPAdapter
 
-# Configure logging
+# Configure logging: request threads only enqueue records, a background
+# listener thread does the file writes
+_log_queue = queue.Queue(-1)
+_log_file_handler = logging.FileHandler("ecr_simulator.log")
+_log_file_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+)
+_log_listener = QueueListener(_log_queue, _log_file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)  # Flush queued records on shutdown
+_log_queue_handler = QueueHandler(_log_queue)
+# Only merge args here; timestamps and levels are added by the file handler
+_log_queue_handler.setFormatter(logging.Formatter("%(message)s"))
 logging.basicConfig(
-    filename="ecr_simulator.log",
+    handlers=[_log_queue_handler],
     level=logging.INFO,  # Set to INFO for production, DEBUG for dev
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
 from flask import Blueprint, request, jsonify, Response
@@ -24,6 +40,20 @@ ecr_bp = Blueprint("ecr", __name__)
 # Define settings file path relative to the script
 BASE_DIR = os.path.dirname(__file__)
 SETTINGS_FILE = os.path.join(BASE_DIR, "settings.json")
+# Served by GET /settings until settings have been saved; never mutated
+_DEFAULT_SETTINGS = {
+    "communication": "Serial",
+    "serial_port": "",
+    "socket_ip": "127.0.0.1",
+    "socket_port": "9001",
+    "speed_baud": "9600",
+    "data_bits": "8",
+    "stop_bits": "1",
+    "parity": "None",
+    "enable_rest_api": False,
+    "enable_ssl": False,
+    "edc_serial_number": "",
+}
 # Load existing settings if available
 app_settings = {}
 if os.path.exists(SETTINGS_FILE):
@@ -39,31 +69,215 @@ if os.path.exists(SETTINGS_FILE):
         app_settings = {}
 else:
     logger.warning("Settings file not found, using defaults")
-transaction_history = {}  # Changed to history, limited to last 5
+_settings_write_lock = threading.Lock()
+
+
+def _save_settings():
+    """Atomically persist the current app_settings (temp file + os.replace)."""
+    # Snapshot under the lock rather than at submit time so a writer that
+    # loses the race for the lock can never replace a newer file with stale data
+    with _settings_write_lock:
+        data = json.dumps(dict(app_settings), indent=4).encode()
+        # Plain open() so the file gets umask permissions, not mkstemp's 0600
+        tmp = SETTINGS_FILE + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, SETTINGS_FILE)
+        except Exception as e:
+            logger.error(f"Settings save error: {e}", exc_info=True)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+transaction_history = OrderedDict()  # Oldest first, limited to last 5
+_hist_lock = threading.Lock()  # Guards transaction_history and its entries
+_TRANS_TYPE_CODE = {
+    "SALE": "01",
+    "INSTALLMENT": "02",
+    "VOID": "03",
+    "REFUND": "04",
+    "QRIS MPM": "05",
+    "QRIS NOTIFICATION": "06",
+    "QRIS REFUND": "07",
+    "POINT REWARD": "08",
+    "TEST HOST": "09",
+    "QRIS CPM": "0A",
+    "SETTLEMENT": "0B",
+    "REPRINT": "0C",
+    "REPORT": "0D",
+    "LOGON": "0E",
+}
+_TRANS_TYPE_NAME = {code: name for name, code in _TRANS_TYPE_CODE.items()}
+_TRANS_TYPE_BYTES = {code: bytes([int(code, 16)]) for code in _TRANS_TYPE_NAME}
+# The ECR adaptor uses a self-signed certificate, so verification is disabled
+_SSL_CTX = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+_SSL_CTX.check_hostname = False
+_SSL_CTX.verify_mode = ssl.CERT_NONE
+# Shared HTTP session so perform_rest reuses TCP/TLS connections to the EDC
+# across the transaction request and every result poll
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+
+def _record_transaction(trx_id, request_data):
+    """Add a processing entry to the history and return it for later updates."""
+    entry = {"status": "processing", "request": request_data, "timestamp": time.time()}
+    with _hist_lock:
+        transaction_history[trx_id] = entry
+        transaction_history.move_to_end(trx_id)  # trxId from the EDC may repeat
+        while len(transaction_history) > 5:
+            transaction_history.popitem(last=False)
+    return entry
+
+
+def _update_transaction(entry, **fields):
+    """Update a history entry; safe even if it has already been evicted."""
+    with _hist_lock:
+        entry.update(fields)
+
+
+# REST transactions by trxId, polled for results by one daemon thread. Records
+# outlive the 5-entry history: a finished one is kept until GET
+# /perform_rest/<trxId> hands it out or _REST_RESULT_TTL expires
+_REST_RESULT_TTL = 300
+_rest_polls = {}
+_rest_poll_lock = threading.Lock()
+_rest_poll_wakeup = threading.Event()
+_rest_poller = None
+
+
+def _start_rest_poller():
+    """Start the result poller thread on first use and wake it up."""
+    global _rest_poller
+    with _rest_poll_lock:
+        if _rest_poller is None or not _rest_poller.is_alive():
+            _rest_poller = threading.Thread(target=_poll_rest_results, daemon=True)
+            _rest_poller.start()
+    _rest_poll_wakeup.set()
+
+
+def _poll_rest_result(trx_id, poll):
+    """Poll one transaction once; return True when it has finished."""
+    entry = poll["entry"]
+    if time.time() >= poll["deadline"]:
+        _update_transaction(
+            entry, status="error", error="Polling timeout", error_code=408
+        )
+        return True
+    try:
+        res = _session.post(
+            poll["url"],
+            json={"trxId": trx_id},
+            auth=poll["auth"],
+            verify=poll["verify"],
+            timeout=10,
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Result polling error: {str(e)}")
+        _update_transaction(entry, status="error", error=str(e), error_code=500)
+        return True
+    if res.status_code == 503:
+        poll["next_poll"] = time.time() + poll["interval"]
+        poll["interval"] = min(poll["interval"] * 1.5, 1.0)
+        return False
+    if res.status_code != 200:
+        logger.error(f"Result request failed: {res.status_code} - {res.text}")
+        _update_transaction(
+            entry, status="error", error=res.text, error_code=res.status_code
+        )
+        return True
+    try:
+        result = res.json()
+    except ValueError as e:
+        logger.error(f"Invalid result body: {str(e)}")
+        _update_transaction(entry, status="error", error=str(e), error_code=502)
+        return True
+    _update_transaction(entry, status="done", response=result)
+    return True
+
+
+def _poll_rest_results():
+    """Poller thread: poll every due transaction, then sleep until the next one."""
+    while True:
+        _rest_poll_wakeup.clear()  # Before the scan, so no new trxId is missed
+        now = time.time()
+        with _rest_poll_lock:
+            # Drop finished results nobody collected in time
+            for trx_id, poll in list(_rest_polls.items()):
+                if poll["finished"] and now - poll["finished"] >= _REST_RESULT_TTL:
+                    del _rest_polls[trx_id]
+            due = [
+                (trx_id, poll)
+                for trx_id, poll in _rest_polls.items()
+                if not poll["finished"] and poll["next_poll"] <= now
+            ]
+        for trx_id, poll in due:
+            with _rest_poll_lock:
+                if _rest_polls.get(trx_id) is not poll:
+                    continue  # Fetched or replaced by a repeated trxId meanwhile
+            try:
+                finished = _poll_rest_result(trx_id, poll)
+            except Exception as e:
+                # Never let one bad result take the poller thread down
+                logger.error(f"Result polling error: {str(e)}", exc_info=True)
+                _update_transaction(
+                    poll["entry"], status="error", error=str(e), error_code=500
+                )
+                finished = True
+            if finished:
+                with _rest_poll_lock:
+                    poll["finished"] = time.time()
+        with _rest_poll_lock:
+            next_due = min(
+                (
+                    (
+                        p["finished"] + _REST_RESULT_TTL
+                        if p["finished"]
+                        else p["next_poll"]
+                    )
+                    for p in _rest_polls.values()
+                ),
+                default=None,
+            )
+        timeout = None if next_due is None else max(next_due - time.time(), 0)
+        _rest_poll_wakeup.wait(timeout)
 
 
 def calculate_lrc(message_bytes):
     """Calculate Longitudinal Redundancy Check (LRC) as per spec."""
-    lrc = 0
-    for byte in message_bytes:
-        lrc ^= byte
+    # Treat the whole message as one little-endian int and fold it in half
+    # until one byte lane is left; every fold XORs all lanes at C speed
+    lrc = int.from_bytes(message_bytes, "little")
+    width = 8
+    while width < len(message_bytes) << 3:
+        width <<= 1
+    while width > 8:
+        width >>= 1
+        lrc = (lrc ^ (lrc >> width)) & ((1 << width) - 1)
     return lrc
 
 
 def build_native_request(trans_type_code, amount_pad, additional_fields={}):
     """Build Native request message with STX, length, data, ETX, and LRC."""
-    trans_type_byte = bytes([int(trans_type_code, 16)])
-    amount_bytes = amount_pad.encode("ascii")
-    data_bytes = trans_type_byte + b"\x1c" + amount_bytes
+    trans_type_byte = _TRANS_TYPE_BYTES.get(trans_type_code) or bytes(
+        [int(trans_type_code, 16)]
+    )
+    parts = [trans_type_byte, b"\x1c", amount_pad.encode("ascii")]
     if "invoiceNo" in additional_fields:
-        invoice_bytes = additional_fields["invoiceNo"].encode("ascii")
-        data_bytes += b"\x1c" + invoice_bytes
-    length_str = f"{len(data_bytes):04d}"
-    length_bytes = length_str.encode("ascii")
-    message = b"\x02" + length_bytes + data_bytes + b"\x03"
-    lrc = calculate_lrc(message)
-    message += bytes([lrc])
-    return message
+        parts += (b"\x1c", additional_fields["invoiceNo"].encode("ascii"))
+    data_bytes = b"".join(parts)
+    # Grow one buffer in place instead of re-copying the message per segment
+    message = bytearray(b"\x02%04d" % len(data_bytes))
+    message += data_bytes
+    message.append(0x03)
+    message.append(calculate_lrc(message))
+    return bytes(message)
 
 
 def parse_native_request(message_bytes):
@@ -85,13 +299,71 @@ def parse_native_request(message_bytes):
     }, None
 
 
+# Native response fields in wire order, with the value used when the EDC
+# sends fewer fields; None means "echo the request amount"
+_RESP_FIELDS = (
+    "responseCode",
+    "approvalCode",
+    "date",
+    "time",
+    "tid",
+    "mid",
+    "invoiceNo",
+    "batchNo",
+    "traceNo",
+    "cardType",
+    "cardNo",
+    "expDate",
+    "cardholderName",
+    "refNumber",
+    "transAmount",
+    "transAddAmount",
+    "totalAmount",
+    "entryMode",
+    "term",
+    "monthlyAmount",
+    "pointReward",
+    "redemptionAmount",
+    "pointBalance",
+    "filler",
+    "referenceId",
+)
+_RESP_DEFAULTS = (
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    "",
+    None,
+    "000000000000",
+    None,
+    "",
+    "00",
+    "000000000000",
+    "000000",
+    "000000000000",
+    "000000",
+    "",
+    "",
+)
+
+
 def parse_native_response(response_bytes):
     """Parse Native response message, validate STX, ETX, and LRC."""
     if not response_bytes or response_bytes[0] != 0x02:
         return None, "Invalid STX"
     if len(response_bytes) < 6:
         return None, "Message too short"
-    length = int(response_bytes[1:5].decode("ascii"))
+    length = int(response_bytes[1:5])  # int() parses ASCII digits from bytes
     if len(response_bytes) < 5 + length + 2:
         return None, "Incomplete message"
     if response_bytes[5 + length] != 0x03:
@@ -99,15 +371,23 @@ def parse_native_response(response_bytes):
     calc_lrc = calculate_lrc(response_bytes[:-1])
     if calc_lrc != response_bytes[-1]:
         return None, "Invalid LRC"
-    data_bytes = response_bytes[5 : 5 + length]
-    fields_bytes = data_bytes.split(b"\x1c")
-    return fields_bytes, None
+    # Decode once and split the str; FS (0x1C) is ASCII so it survives decoding
+    fields = response_bytes[5 : 5 + length].decode("ascii", errors="ignore")
+    return fields.split("\x1c"), None
 
 
-def send_serial_message(serial_port, message, timeout=2):
-    """Send message over serial and wait for ACK/NAK and response with timeout."""
-    try:
-        ser = serial.Serial(
+_SERIAL_KEYS = ("serial_port", "speed_baud", "data_bits", "stop_bits", "parity")
+_serial_handle = None
+_serial_lock = threading.Lock()  # Held for the whole exchange on the shared port
+
+
+def _get_serial(serial_port, timeout):
+    """Return the cached port, opening it on first use. Caller holds _serial_lock."""
+    global _serial_handle
+    if _serial_handle is not None and _serial_handle.port != serial_port:
+        _close_serial()
+    if _serial_handle is None or not _serial_handle.is_open:
+        _serial_handle = serial.Serial(
             port=serial_port,
             baudrate=int(app_settings.get("speed_baud", 9600)),
             bytesize=int(app_settings.get("data_bits", 8)),
@@ -115,40 +395,67 @@ def send_serial_message(serial_port, message, timeout=2):
             parity=app_settings.get("parity", "N")[0].upper(),
             timeout=timeout,
         )
-        ser.write(message)
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            ack_nak = ser.read(1)
-            if ack_nak:
-                break
-        if not ack_nak:
-            ser.close()
-            return None, "No ACK/NAK received within timeout"
-        if ack_nak == b"\x15":
-            ser.close()
-            return None, "NAK received"
-        if ack_nak != b"\x06":
-            ser.close()
-            return None, "Invalid ACK/NAK"
-        response = b""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            byte = ser.read(1)
-            if not byte:
-                continue
-            response += byte
-            if byte == b"\x03":
-                response += ser.read(1)  # LRC
-                break
-        if not response or b"\x03" not in response:
-            ser.close()
-            return None, "Incomplete response within timeout"
-        ser.write(b"\x06")
-        ser.close()
-        return response, None
-    except Exception as e:
-        logger.error(f"Serial communication error: {str(e)}")
-        return None, f"Serial communication error: {str(e)}"
+    elif _serial_handle.timeout != timeout:
+        _serial_handle.timeout = timeout
+    return _serial_handle
+
+
+def _close_serial():
+    """Close and forget the cached port. Caller holds _serial_lock."""
+    global _serial_handle
+    if _serial_handle is not None:
+        try:
+            _serial_handle.close()
+        except Exception as e:
+            logger.error(f"Serial close error: {str(e)}")
+        _serial_handle = None
+
+
+def send_serial_message(serial_port, message, timeout=2):
+    """Send message over serial and wait for ACK/NAK and response with timeout."""
+    with _serial_lock:
+        try:
+            ser = _get_serial(serial_port, timeout)
+            ser.reset_input_buffer()  # Drop anything left by an aborted exchange
+            ser.write(message)
+            ack_nak = ser.read(1)  # Blocks up to the port timeout
+            if not ack_nak:
+                return None, "No ACK/NAK received within timeout"
+            if ack_nak == b"\x15":
+                return None, "NAK received"
+            if ack_nak != b"\x06":
+                return None, "Invalid ACK/NAK"
+            # STX + 4-digit length, then data + ETX + LRC in one read
+            header = ser.read(5)
+            if len(header) < 5:
+                return None, "Incomplete response within timeout"
+            if header[0] != 0x02 or not header[1:5].isdigit():
+                return None, "Invalid response header"
+            length = int(header[1:5])
+            body = ser.read(length + 2)
+            if len(body) < length + 2:
+                return None, "Incomplete response within timeout"
+            response = header + body
+            ser.write(b"\x06")
+            return response, None
+        except Exception as e:
+            # The port may be gone (unplugged, reset); reopen on the next call
+            _close_serial()
+            logger.error(f"Serial communication error: {str(e)}")
+            return None, f"Serial communication error: {str(e)}"
+
+
+def _recv_exact(sock, n):
+    """Receive exactly n bytes, raising ConnectionError if the peer closes early."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    offset = 0
+    while offset < n:
+        received = sock.recv_into(view[offset:])
+        if not received:
+            raise ConnectionError("Connection closed before full response")
+        offset += received
+    return bytes(buf)
 
 
 def send_socket_message(ip, port, message, ssl_enabled=False):
@@ -157,23 +464,14 @@ def send_socket_message(ip, port, message, ssl_enabled=False):
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(10)
         if ssl_enabled:
-            import ssl
-
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            sock = context.wrap_socket(sock)
+            sock = _SSL_CTX.wrap_socket(sock)
         sock.connect((ip, port))
+        sock.settimeout(2)  # ACK/NAK and response windows
         sock.send(message)
-        start_time = time.time()
-        ack_nak = b""
-        while time.time() - start_time < 2:
-            try:
-                ack_nak = sock.recv(1)
-                if ack_nak:
-                    break
-            except OSError:
-                pass
+        try:
+            ack_nak = sock.recv(1)
+        except OSError:
+            ack_nak = b""
         if not ack_nak:
             sock.close()
             return None, "No ACK/NAK received within timeout"
@@ -183,20 +481,14 @@ def send_socket_message(ip, port, message, ssl_enabled=False):
         if ack_nak != b"\x06":
             sock.close()
             return None, "Invalid ACK/NAK"
-        response = b""
-        start_time = time.time()
-        while time.time() - start_time < 2:
-            try:
-                byte = sock.recv(1)
-                if not byte:
-                    continue
-                response += byte
-                if byte == b"\x03":
-                    response += sock.recv(1)  # LRC
-                    break
-            except OSError:
-                pass
-        if not response or b"\x03" not in response:
+        try:
+            header = _recv_exact(sock, 5)
+            if header[0] != 0x02 or not header[1:5].isdigit():
+                sock.close()
+                return None, "Invalid response header"
+            length = int(header[1:5])
+            response = header + _recv_exact(sock, length + 2)
+        except OSError:
             sock.close()
             return None, "Incomplete response within timeout"
         sock.send(b"\x06")
@@ -215,23 +507,7 @@ def build_request():
     transaction_type = data.get("transaction_type", "SALE")
     amount = data.get("amount", "0.00")
     invoice_no = data.get("invoiceNo", None)
-    trans_type_map = {
-        "SALE": "01",
-        "INSTALLMENT": "02",
-        "VOID": "03",
-        "REFUND": "04",
-        "QRIS MPM": "05",
-        "QRIS NOTIFICATION": "06",
-        "QRIS REFUND": "07",
-        "POINT REWARD": "08",
-        "TEST HOST": "09",
-        "QRIS CPM": "0A",
-        "SETTLEMENT": "0B",
-        "REPRINT": "0C",
-        "REPORT": "0D",
-        "LOGON": "0E",
-    }
-    trans_code = trans_type_map.get(transaction_type.upper(), "01")
+    trans_code = _TRANS_TYPE_CODE.get(transaction_type.upper(), "01")
     amount_pad = f"{int(float(amount) * 100):012d}"
     additional = {}
     if (
@@ -248,7 +524,7 @@ def build_request():
         req_bytes = build_native_request(trans_code, amount_pad, additional)
         return jsonify(
             {
-                "request": binascii.hexlify(req_bytes).upper().decode("ascii"),
+                "request": req_bytes.hex().upper(),
                 "type": "hex",
             }
         )
@@ -262,11 +538,12 @@ def native_process():
         if not message_hex or not isinstance(message_hex, str):
             logger.error("Invalid or missing message_hex")
             return jsonify({"error": "Invalid or missing message_hex"}), 400
-        if not all(c in "0123456789ABCDEFabcdef" for c in message_hex):
+        try:
+            message_bytes = bytes.fromhex(message_hex)
+        except ValueError:
             logger.error(f"Invalid hexadecimal string: {message_hex}")
             return jsonify({"error": "Invalid hexadecimal string"}), 400
-        message_bytes = binascii.unhexlify(message_hex)
-        if message_bytes[0] != 0x02:
+        if not message_bytes or message_bytes[0] != 0x02:
             logger.error(f"Invalid STX in message: {message_hex}")
             return jsonify({"error": "Invalid STX"}), 400
         # Parse request for history
@@ -274,11 +551,7 @@ def native_process():
         if parse_err:
             return jsonify({"error": parse_err}), 400
         trx_id = uuid.uuid4().hex[:8].upper()
-        transaction_history[trx_id] = {
-            "status": "processing",
-            "request": req_parsed,
-            "timestamp": time.time(),
-        }
+        entry = _record_transaction(trx_id, req_parsed)
         communication_type = app_settings.get("communication", "Serial")
         logger.info(f"Using communication type: {communication_type}")
         error = None
@@ -302,61 +575,22 @@ def native_process():
             )
         if error:
             logger.error(f"Communication error: {error}")
-            transaction_history[trx_id]["status"] = "error"
-            transaction_history[trx_id]["error"] = error
+            _update_transaction(entry, status="error", error=error)
             return jsonify({"error": error}), 500
-        fields_bytes, parse_error = parse_native_response(response_bytes)
+        fields, parse_error = parse_native_response(response_bytes)
         if parse_error:
             logger.error(f"Parse error: {parse_error}")
-            transaction_history[trx_id]["status"] = "error"
-            transaction_history[trx_id]["error"] = parse_error
+            _update_transaction(entry, status="error", error=parse_error)
             return jsonify({"error": parse_error}), 400
-        # Parse response fields
-        fields_str = [f.decode("ascii", errors="ignore") for f in fields_bytes]
-        response_data = {
-            "responseCode": fields_str[0] if len(fields_str) > 0 else "",
-            "approvalCode": fields_str[1] if len(fields_str) > 1 else "",
-            "date": fields_str[2] if len(fields_str) > 2 else "",
-            "time": fields_str[3] if len(fields_str) > 3 else "",
-            "tid": fields_str[4] if len(fields_str) > 4 else "",
-            "mid": fields_str[5] if len(fields_str) > 5 else "",
-            "invoiceNo": fields_str[6] if len(fields_str) > 6 else "",
-            "batchNo": fields_str[7] if len(fields_str) > 7 else "",
-            "traceNo": fields_str[8] if len(fields_str) > 8 else "",
-            "cardType": fields_str[9] if len(fields_str) > 9 else "",
-            "cardNo": fields_str[10] if len(fields_str) > 10 else "",
-            "expDate": fields_str[11] if len(fields_str) > 11 else "",
-            "cardholderName": fields_str[12] if len(fields_str) > 12 else "",
-            "refNumber": fields_str[13] if len(fields_str) > 13 else "",
-            "transAmount": (
-                fields_str[14] if len(fields_str) > 14 else req_parsed["transAmount"]
-            ),
-            "transAddAmount": (
-                fields_str[15] if len(fields_str) > 15 else "000000000000"
-            ),
-            "totalAmount": (
-                fields_str[16] if len(fields_str) > 16 else req_parsed["transAmount"]
-            ),
-            "entryMode": fields_str[17] if len(fields_str) > 17 else "",
-            "term": fields_str[18] if len(fields_str) > 18 else "00",
-            "monthlyAmount": fields_str[19] if len(fields_str) > 19 else "000000000000",
-            "pointReward": fields_str[20] if len(fields_str) > 20 else "000000",
-            "redemptionAmount": (
-                fields_str[21] if len(fields_str) > 21 else "000000000000"
-            ),
-            "pointBalance": fields_str[22] if len(fields_str) > 22 else "000000",
-            "filler": fields_str[23] if len(fields_str) > 23 else "",
-            "referenceId": fields_str[24] if len(fields_str) > 24 else "",
-        }
-        transaction_history[trx_id]["status"] = "done"
-        transaction_history[trx_id]["response"] = response_data
-        # Limit history to 5
-        if len(transaction_history) > 5:
-            oldest = min(
-                transaction_history, key=lambda k: transaction_history[k]["timestamp"]
+        # Parse response fields, filling any the EDC left off with defaults
+        response_data = dict(zip(_RESP_FIELDS, fields))
+        count = len(fields)
+        for key, default in zip(_RESP_FIELDS[count:], _RESP_DEFAULTS[count:]):
+            response_data[key] = (
+                req_parsed["transAmount"] if default is None else default
             )
-            del transaction_history[oldest]
-        response_hex = binascii.hexlify(response_bytes).upper().decode("ascii")
+        _update_transaction(entry, status="done", response=response_data)
+        response_hex = response_bytes.hex().upper()
         return (
             jsonify(
                 {
@@ -368,9 +602,6 @@ def native_process():
             ),
             200,
         )
-    except binascii.Error as e:
-        logger.error(f"Hex decoding error: {str(e)} - Message: {message_hex}")
-        return jsonify({"error": f"Hex decoding error: {str(e)}"}), 400
     except serial.SerialException as e:
         logger.error(f"Serial communication error: {str(e)}")
         return jsonify({"error": f"Serial communication error: {str(e)}"}), 500
@@ -398,7 +629,7 @@ def perform_rest():
     )  # Ignore self-signed cert
     trx_url = f"{protocol}://{ip}:{port}/transaction/cimb"
     try:
-        res = requests.post(
+        res = _session.post(
             trx_url, json=data, auth=(username, password), verify=verify, timeout=10
         )
         if res.status_code != 200:
@@ -409,69 +640,46 @@ def perform_rest():
     except requests.exceptions.RequestException as e:
         logger.error(f"Transaction request error: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    transaction_history[trx_id] = {
-        "status": "processing",
-        "request": data,
-        "timestamp": time.time(),
+    entry = _record_transaction(trx_id, data)
+    # Hand the result polling to the background poller and return at once
+    poll = {
+        "entry": entry,
+        "url": f"{protocol}://{ip}:{port}/result/cimb",
+        "auth": (username, password),
+        "verify": verify,
+        "deadline": time.time() + 60,  # 60s timeout
+        "next_poll": time.time(),
+        "interval": 0.05,  # Back off from 50ms up to 1s while the EDC is busy
+        "finished": None,  # Completion time once the result is in
     }
-    result_url = f"{protocol}://{ip}:{port}/result/cimb"
-    start_time = time.time()
-    while time.time() - start_time < 60:  # 60s timeout
-        try:
-            res = requests.post(
-                result_url,
-                json={"trxId": trx_id},
-                auth=(username, password),
-                verify=verify,
-                timeout=10,
-            )
-            if res.status_code == 503:
-                time.sleep(1)
-                continue
-            if res.status_code != 200:
-                logger.error(f"Result request failed: {res.status_code} - {res.text}")
-                transaction_history[trx_id]["status"] = "error"
-                transaction_history[trx_id]["error"] = res.text
-                return jsonify({"error": res.text}), res.status_code
-            result = res.json()
-            transaction_history[trx_id]["status"] = "done"
-            transaction_history[trx_id]["response"] = result
-            # Limit history to 5
-            if len(transaction_history) > 5:
-                oldest = min(
-                    transaction_history,
-                    key=lambda k: transaction_history[k]["timestamp"],
-                )
-                del transaction_history[oldest]
-            return jsonify(result), 200
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Result polling error: {str(e)}")
-            transaction_history[trx_id]["status"] = "error"
-            transaction_history[trx_id]["error"] = str(e)
-            return jsonify({"error": str(e)}), 500
-    transaction_history[trx_id]["status"] = "error"
-    transaction_history[trx_id]["error"] = "Polling timeout"
-    return jsonify({"error": "Polling timeout"}), 408
+    with _rest_poll_lock:
+        _rest_polls[trx_id] = poll
+    _start_rest_poller()
+    return jsonify({"trxId": trx_id, "status": "processing"}), 202
+
+
+@ecr_bp.route("/perform_rest/<trx_id>", methods=["GET"])
+def perform_rest_result(trx_id):
+    with _rest_poll_lock:
+        poll = _rest_polls.get(trx_id)
+        if poll is None:
+            return jsonify({"error": "Unknown transaction"}), 404
+        if not poll["finished"]:
+            return jsonify({"trxId": trx_id, "status": "processing"}), 202
+        del _rest_polls[trx_id]  # Result handed out; nothing left to keep
+    # The history entry may have been evicted already; the record still holds it
+    entry = poll["entry"]
+    with _hist_lock:
+        if entry["status"] == "done":
+            return jsonify(entry["response"]), 200
+        return jsonify({"error": entry["error"]}), entry.get("error_code", 500)
 
 
 @ecr_bp.route("/settings", methods=["GET", "POST"])
 def manage_settings():
     global app_settings
     if request.method == "GET":
-        default_settings = {
-            "communication": "Serial",
-            "serial_port": "",
-            "socket_ip": "127.0.0.1",
-            "socket_port": "9001",
-            "speed_baud": "9600",
-            "data_bits": "8",
-            "stop_bits": "1",
-            "parity": "None",
-            "enable_rest_api": False,
-            "enable_ssl": False,
-            "edc_serial_number": "",
-        }
-        return jsonify(app_settings or default_settings)
+        return jsonify(app_settings or _DEFAULT_SETTINGS)
     elif request.method == "POST":
         try:
             new_settings = request.get_json()
@@ -480,6 +688,7 @@ def manage_settings():
                     jsonify({"status": "Error", "message": "Invalid settings format"}),
                     400,
                 )
+            old_serial = tuple(app_settings.get(k) for k in _SERIAL_KEYS)
             # Validate and sanitize settings
             app_settings.update(
                 {
@@ -496,9 +705,11 @@ def manage_settings():
                     "edc_serial_number": str(new_settings.get("edc_serial_number", "")),
                 }
             )
-            # Save to file with error handling
-            with open(SETTINGS_FILE, "w") as f:
-                json.dump(app_settings, f, indent=4)
+            if tuple(app_settings.get(k) for k in _SERIAL_KEYS) != old_serial:
+                with _serial_lock:
+                    _close_serial()  # Reopened with the new parameters on next use
+            # Persist off the request thread
+            threading.Thread(target=_save_settings, daemon=True).start()
             return jsonify(
                 {"status": "Settings saved successfully", "settings": app_settings}
             )
@@ -537,6 +748,9 @@ def test_connection():
                 400,
             )
         try:
+            # Release the cached handle so the probe can open the port exclusively
+            with _serial_lock:
+                _close_serial()
             ser = serial.Serial(
                 port=serial_port,
                 baudrate=int(settings.get("speed_baud", 9600)),
@@ -565,12 +779,7 @@ def test_connection():
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             sock.settimeout(2)
             if ssl_enabled:
-                import ssl
-
-                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-                sock = context.wrap_socket(sock)
+                sock = _SSL_CTX.wrap_socket(sock)
             sock.connect((socket_ip, socket_port))
             sock.close()
             return jsonify(
@@ -589,35 +798,18 @@ def test_connection():
 
 @ecr_bp.route("/history", methods=["GET"])
 def get_history():
-    trans_type_map = {
-        "01": "SALE",
-        "02": "INSTALLMENT",
-        "03": "VOID",
-        "04": "REFUND",
-        "05": "QRIS MPM",
-        "06": "QRIS NOTIFICATION",
-        "07": "QRIS REFUND",
-        "08": "POINT REWARD",
-        "09": "TEST HOST",
-        "0A": "QRIS CPM",
-        "0B": "SETTLEMENT",
-        "0C": "REPRINT",
-        "0D": "REPORT",
-        "0E": "LOGON",
-    }
-    history = [
-        {
-            "id": k,
-            "timestamp": v["timestamp"],
-            "transaction_type": trans_type_map.get(
-                v["request"]["transType"], "UNKNOWN"
-            ),
-            "amount": str(int(v["request"]["transAmount"]) / 100),
-            "status": v["status"].upper(),
-            "transaction_id": k,
-        }
-        for k, v in sorted(
-            transaction_history.items(), key=lambda x: x[1]["timestamp"], reverse=True
-        )
-    ]
+    with _hist_lock:
+        history = [
+            {
+                "id": k,
+                "timestamp": v["timestamp"],
+                "transaction_type": _TRANS_TYPE_NAME.get(
+                    v["request"]["transType"], "UNKNOWN"
+                ),
+                "amount": str(int(v["request"]["transAmount"]) / 100),
+                "status": v["status"].upper(),
+                "transaction_id": k,
+            }
+            for k, v in reversed(transaction_history.items())
+        ]
     return jsonify(history)
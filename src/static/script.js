@@ -209,7 +209,8 @@ class ECRSimulator {
                     body: JSON.stringify({
                         transaction_type,
                         amount,
-                        invoiceNo: this.invoiceNoInput.value || null
+                        invoiceNo: this.invoiceNoInput.value || null,
+                        include_hex: this.requestType !== 'json'
                     })
                 });
                 const result = await res.json();